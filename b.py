@@ -1,24 +1,53 @@
+import asyncio
+import concurrent.futures
 import logging
 import re
+import tempfile
 import aiohttp
 import aiofiles
+import aiosqlite
 import hashlib
 import json
 import os
-import requests
 from pyrogram import Client, filters
 from pyrogram.handlers import MessageHandler
 from pyrogram.enums import ChatType
+from pyrogram.errors import BadRequest
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.combining import AndTrigger
 from apscheduler.triggers.interval import IntervalTrigger
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
-from bs4 import BeautifulSoup
+from selectolax.lexbor import LexborHTMLParser
 from urllib.parse import urljoin, urlparse
 from datetime import datetime
 import pytz
 
+try:
+    from blake3 import blake3 as content_hasher
+    HASH_ALGO = 'blake3'
+except ImportError:
+    content_hasher = hashlib.sha256
+    HASH_ALGO = 'sha256'
+
+try:
+    import orjson
+
+    def dump_json(data):
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+
+    load_json = orjson.loads
+except ImportError:
+    def dump_json(data):
+        return json.dumps(data, indent=4).encode()
+
+    load_json = json.loads
+
+try:
+    import ada_url
+except ImportError:
+    ada_url = None
+
 # Setup logging
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -28,11 +57,20 @@ logger = logging.getLogger(__name__)
 
 # Configuration
 USER_DATA_FILE = 'user_data.json'
+STATE_DB_FILE = 'state.sqlite'
 CHANNELS_FILE = 'authorized_channels.json'
 SUDO_USERS_FILE = 'sudo_users.json'
 OWNER_ID = 6556141430
 MAX_FILE_SIZE = 45 * 1024 * 1024  # 45MB
+DOWNLOAD_CHUNK_SIZE = 64 * 1024  # 64KB
+RANGE_THRESHOLD = 4 * 1024 * 1024  # 4MB
+RANGE_PARTS = 4
 CHECK_INTERVAL = 30  # Minutes
+FLUSH_DELAY = 1  # Seconds
+MAX_CONCURRENT_DOWNLOADS = 8
+MAX_CONCURRENT_SENDS = 4
+CHECK_WORKERS = 16  # Also bounds concurrent site checks
+PARSE_WORKERS = 4
 DEFAULT_TZ = pytz.timezone("Asia/Kolkata")
 
 # Supported file types
@@ -40,7 +78,13 @@ DOCUMENT_EXTS = ['.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx', '.tx
 IMAGE_EXTS = ['.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp']
 AUDIO_EXTS = ['.mp3', '.wav', '.ogg']
 VIDEO_EXTS = ['.mp4', '.mov', '.avi', '.mkv']
-ALLOWED_EXTS = DOCUMENT_EXTS + IMAGE_EXTS + AUDIO_EXTS + VIDEO_EXTS
+EXT_TO_TYPE = (
+    {e: 'document' for e in DOCUMENT_EXTS}
+    | {e: 'image' for e in IMAGE_EXTS}
+    | {e: 'audio' for e in AUDIO_EXTS}
+    | {e: 'video' for e in VIDEO_EXTS}
+)
+MEDIA_SELECTOR = 'a[href], img[src], audio[src], video[src], source[src]'
 
 # Scheduler configuration
 jobstores = {
@@ -54,129 +98,512 @@ job_defaults = {
 
 scheduler = AsyncIOScheduler(jobstores=jobstores, job_defaults=job_defaults, timezone=DEFAULT_TZ)
 
+# Shared HTTP session (created lazily inside the running event loop)
+_SESSION = None
+
+async def get_session():
+    global _SESSION
+    if _SESSION is None or _SESSION.closed:
+        _SESSION = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=64, limit_per_host=8, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=60)
+        )
+    return _SESSION
+
+async def close_session():
+    global _SESSION
+    if _SESSION is not None and not _SESSION.closed:
+        await _SESSION.close()
+    _SESSION = None
+
+# Large bodies may take minutes; only bound connect and per-read stalls
+DOWNLOAD_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=60)
+
+# Concurrency limits for downloads and sends
+DL_SEM = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+SEND_SEM = asyncio.Semaphore(MAX_CONCURRENT_SENDS)
+
+# HTML parsing runs off the event loop
+PARSE_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=PARSE_WORKERS)
+
+def write_json_atomic(path, data):
+    # Write beside the target and swap in, so a crash never leaves a truncated file
+    tmp = f"{path}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(dump_json(data))
+    os.replace(tmp, path)
+
 def load_channels():
     try:
-        with open(CHANNELS_FILE, 'r') as f:
-            return json.load(f)
+        with open(CHANNELS_FILE, 'rb') as f:
+            return load_json(f.read())
     except (FileNotFoundError, json.JSONDecodeError):
         return []
 
 def save_channels(channels):
-    with open(CHANNELS_FILE, 'w') as f:
-        json.dump(channels, f, indent=4)
+    write_json_atomic(CHANNELS_FILE, channels)
 
 def load_sudo_users():
     try:
-        with open(SUDO_USERS_FILE, 'r') as f:
-            return json.load(f)
+        with open(SUDO_USERS_FILE, 'rb') as f:
+            return load_json(f.read())
     except (FileNotFoundError, json.JSONDecodeError):
         return []
 
 def save_sudo_users(sudo_users):
-    with open(SUDO_USERS_FILE, 'w') as f:
-        json.dump(sudo_users, f, indent=4)
+    write_json_atomic(SUDO_USERS_FILE, sudo_users)
 
 def load_user_data():
     try:
-        with open(USER_DATA_FILE, 'r') as f:
-            return json.load(f)
+        with open(USER_DATA_FILE, 'rb') as f:
+            return load_json(f.read())
     except (FileNotFoundError, json.JSONDecodeError):
         return {}
 
-def save_user_data(user_data):
-    with open(USER_DATA_FILE, 'w') as f:
-        json.dump(user_data, f, indent=4)
+# Tracked URL state lives in SQLite, one row per (user, url)
+TRACKED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tracked (
+    user_id TEXT,
+    url TEXT,
+    hash TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    files TEXT,
+    meta TEXT,
+    PRIMARY KEY (user_id, url)
+)
+"""
+TRACKED_COLUMNS = ('hash', 'etag', 'last_modified')
+
+_DB = None
+
+async def get_state_db():
+    global _DB
+    if _DB is None:
+        _DB = await aiosqlite.connect(STATE_DB_FILE)
+        await _DB.execute(TRACKED_SCHEMA)
+        await _DB.commit()
+    return _DB
+
+async def close_state_db():
+    global _DB
+    if _DB is not None:
+        await _DB.close()
+    _DB = None
+
+# In-memory user data; changed rows are written back at most once per FLUSH_DELAY
+_USER_DATA = None
+_DIRTY = set()
+_FLUSH_TASK = None
+_LOAD_LOCK = asyncio.Lock()
+
+async def get_user_data():
+    global _USER_DATA
+    async with _LOAD_LOCK:
+        if _USER_DATA is None:
+            _USER_DATA = await load_tracked_urls()
+    return _USER_DATA
+
+async def load_tracked_urls():
+    db = await get_state_db()
+    user_data = {}
+    async with db.execute('SELECT user_id, url, hash, etag, last_modified, files, meta FROM tracked') as cursor:
+        async for user_id, url, *columns, files, meta in cursor:
+            info = load_json(meta)
+            info.update({key: value for key, value in zip(TRACKED_COLUMNS, columns) if value is not None})
+            info['files'] = load_json(files)
+            user_data.setdefault(user_id, {}).setdefault('tracked_urls', {})[url] = info
+
+    # One-off import of the legacy JSON state
+    if not user_data and os.path.exists(USER_DATA_FILE):
+        user_data = load_user_data()
+        for user_id, data in user_data.items():
+            for url in data.get('tracked_urls', {}):
+                _DIRTY.add((user_id, url))
+        await flush_tracked_urls(user_data)
+        # Move the file aside so an emptied table doesn't re-import it on restart
+        os.replace(USER_DATA_FILE, f"{USER_DATA_FILE}.migrated")
+        logger.info(f"Imported {USER_DATA_FILE} into {STATE_DB_FILE}")
+    return user_data
+
+def mark_user_data_dirty(user_id, url):
+    global _FLUSH_TASK
+    _DIRTY.add((user_id, url))
+    if _FLUSH_TASK is None or _FLUSH_TASK.done():
+        _FLUSH_TASK = asyncio.create_task(flush_soon())
+
+async def flush_soon():
+    # Keep going until nothing was marked while the previous write ran
+    while _DIRTY:
+        await asyncio.sleep(FLUSH_DELAY)
+        try:
+            await flush_user_data()
+        except Exception as e:
+            logger.error(f"Saving user data failed, will retry: {e}")
+
+async def flush_user_data():
+    if _USER_DATA is not None:
+        await flush_tracked_urls(_USER_DATA)
+
+async def flush_tracked_urls(user_data):
+    if not _DIRTY:
+        return
+    dirty = list(_DIRTY)
+    _DIRTY.clear()
 
-async def download_file(url, custom_name=None):
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                response.raise_for_status()
-                
-                content_type = response.headers.get('Content-Type', '')
-                ext = os.path.splitext(urlparse(url).path)[1].lower()
-                
-                # Determine file type
-                if not ext:
-                    if 'audio' in content_type:
-                        ext = '.mp3'
-                    elif 'video' in content_type:
-                        ext = '.mp4'
-                    elif 'image' in content_type:
-                        ext = '.jpg'
-                    elif 'pdf' in content_type:
-                        ext = '.pdf'
-                    else:
-                        ext = '.bin'
-
-                base_name = custom_name or os.path.splitext(os.path.basename(urlparse(url).path))[0]
-                safe_name = re.sub(r'[\\/*?:"<>|]', '_', base_name).strip()
-                filename = f"{safe_name}{ext}"
-                
-                async with aiofiles.open(filename, 'wb') as f:
-                    await f.write(await response.read())
-                    return filename
-    except Exception as e:
-        logger.error(f"Download error {url}: {e}")
+        db = await get_state_db()
+        for user_id, url in dirty:
+            info = user_data.get(user_id, {}).get('tracked_urls', {}).get(url)
+            if info is None:
+                await db.execute('DELETE FROM tracked WHERE user_id = ? AND url = ?', (user_id, url))
+                continue
+
+            meta = {key: value for key, value in info.items() if key not in TRACKED_COLUMNS and key != 'files'}
+            await db.execute(
+                'INSERT OR REPLACE INTO tracked VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (
+                    user_id, url,
+                    *(info.get(key) for key in TRACKED_COLUMNS),
+                    dump_json(info.get('files', [])).decode(),
+                    dump_json(meta).decode()
+                )
+            )
+        await db.commit()
+    except Exception:
+        # Nothing is lost: the keys are written again on the next flush
+        _DIRTY.update(dirty)
+        raise
+
+_SANITIZE_RE = re.compile(r'[\\/*?:"<>|]')
+
+def sanitize_filename(name):
+    return _SANITIZE_RE.sub('_', name).strip()
+
+# URL helpers backed by ada-url when installed, urllib otherwise
+def resolve_url(base_url, href):
+    # Returns (absolute url, path) from a single parse; (None, '') for malformed links
+    try:
+        if ada_url is None:
+            url = urljoin(base_url, href)
+            return url, urlparse(url).path
+        parsed = ada_url.URL(href, base_url)
+        return parsed.href, parsed.pathname
+    except ValueError:
+        return None, ''
+
+def url_path(url):
+    try:
+        if ada_url is None:
+            return urlparse(url).path
+        return ada_url.URL(url).pathname
+    except ValueError:
+        return ''
+
+def build_filename(url, content_type, custom_name=None, directory=''):
+    path = url_path(url)
+    ext = os.path.splitext(path)[1].lower()
+
+    # Determine file type
+    if not ext:
+        if 'audio' in content_type:
+            ext = '.mp3'
+        elif 'video' in content_type:
+            ext = '.mp4'
+        elif 'image' in content_type:
+            ext = '.jpg'
+        elif 'pdf' in content_type:
+            ext = '.pdf'
+        else:
+            ext = '.bin'
+
+    base_name = custom_name or os.path.splitext(os.path.basename(path))[0]
+    safe_name = sanitize_filename(base_name)
+    return os.path.join(directory, f"{safe_name}{ext}")
+
+async def download_range(session, url, filename, start, end, size):
+    async with session.get(url, headers={'Range': f'bytes={start}-{end}'}, timeout=DOWNLOAD_TIMEOUT) as response:
+        response.raise_for_status()
+        if response.status != 206:
+            raise ValueError(f"Range request not honoured (HTTP {response.status})")
+
+        content_range = response.headers.get('Content-Range', '')
+        if content_range != f"bytes {start}-{end}/{size}":
+            raise ValueError(f"Unexpected Content-Range {content_range!r} for bytes {start}-{end}/{size}")
+
+        # A short or oversized part would leave holes or overwrite its neighbour
+        expected = end - start + 1
+        written = 0
+        async with aiofiles.open(filename, 'r+b') as f:
+            await f.seek(start)
+            async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                written += len(chunk)
+                if written > expected:
+                    break
+                await f.write(chunk)
+
+        if written != expected:
+            raise ValueError(f"Range {start}-{end} returned {written} bytes, expected {expected}")
+
+async def download_ranges(session, url, filename, size):
+    # Pre-allocate so every part can seek to its own offset
+    async with aiofiles.open(filename, 'wb') as f:
+        await f.truncate(size)
+
+    part_size = -(-size // RANGE_PARTS)
+    await asyncio.gather(*[
+        download_range(session, url, filename, start, min(start + part_size, size) - 1, size)
+        for start in range(0, size, part_size)
+    ])
+
+async def download_stream(session, url, custom_name=None, directory=''):
+    async with session.get(url, timeout=DOWNLOAD_TIMEOUT) as response:
+        response.raise_for_status()
+        filename = build_filename(url, response.headers.get('Content-Type', ''), custom_name, directory)
+
+        size = 0
+        async with aiofiles.open(filename, 'wb') as f:
+            async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > MAX_FILE_SIZE:
+                    break
+                await f.write(chunk)
+
+    if size > MAX_FILE_SIZE:
+        os.remove(filename)
+        logger.warning(f"Skipping {url}: larger than {MAX_FILE_SIZE} bytes")
         return None
+    return filename
+
+async def download_file(url, custom_name=None, directory=''):
+    async with DL_SEM:
+        try:
+            session = await get_session()
+
+            # Probe size and range support before pulling the body
+            async with session.head(url, allow_redirects=True) as head:
+                headers = head.headers if head.status < 400 else {}
+                size = int(headers.get('Content-Length', 0))
+                accepts_ranges = headers.get('Accept-Ranges', '').lower() == 'bytes'
+                content_type = headers.get('Content-Type', '')
+
+            if size > MAX_FILE_SIZE:
+                logger.warning(f"Skipping {url}: larger than {MAX_FILE_SIZE} bytes")
+                return None
+
+            if accepts_ranges and size >= RANGE_THRESHOLD:
+                filename = build_filename(url, content_type, custom_name, directory)
+                try:
+                    await download_ranges(session, url, filename, size)
+                    return filename
+                except Exception as e:
+                    logger.warning(f"Ranged download failed for {url}, streaming instead: {e}")
+
+            return await download_stream(session, url, custom_name, directory)
+        except Exception as e:
+            # Oversized files return None above; real failures propagate so callers can retry
+            logger.error(f"Download error {url}: {e}")
+            raise
+
+async def fetch_url_content(url, etag=None, last_modified=None):
+    headers = {'Accept': 'text/html,application/xhtml+xml'}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+
+    session = await get_session()
+    async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=15)) as response:
+        if response.status == 304:
+            return None, None, {}
+        response.raise_for_status()
+
+        # Only markup can contain links; don't pull binary bodies
+        content_type = response.headers.get('Content-Type', '')
+        if not content_type.startswith(('text/', 'application/xhtml', 'application/xml')):
+            logger.warning(f"Skipping {url}: unsupported Content-Type {content_type!r}")
+            return None, None, {}
+
+        # Hash the body as it arrives instead of re-encoding the decoded text
+        hasher = content_hasher()
+        body = bytearray()
+        async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+            hasher.update(chunk)
+            body.extend(chunk)
+
+        validators = {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified')
+        }
+        return body.decode(response.charset or 'utf-8', errors='replace'), hasher.hexdigest(), validators
 
 def extract_files(html_content, base_url):
-    soup = BeautifulSoup(html_content, 'lxml')
-    files = []
-
-    # Extract all media elements
-    for tag in soup.find_all(['a', 'img', 'audio', 'video', 'source']):
-        url = None
-        name = ''
-        file_type = 'document'
-        
-        if tag.name == 'a' and tag.get('href'):
-            url = urljoin(base_url, tag['href'])
-            name = tag.text.strip()
-        elif tag.name in ['img', 'audio', 'video', 'source'] and tag.get('src'):
-            url = urljoin(base_url, tag['src'])
-            name = tag.get('alt', tag.get('title', ''))
-        
-        if url and any(url.lower().endswith(tuple(ALLOWED_EXTS)):
-            # Determine file type
-            if url.lower().endswith(tuple(IMAGE_EXTS)):
-                file_type = 'image'
-            elif url.lower().endswith(tuple(AUDIO_EXTS)):
-                file_type = 'audio'
-            elif url.lower().endswith(tuple(VIDEO_EXTS)):
-                file_type = 'video'
-            elif url.lower().endswith(tuple(DOCUMENT_EXTS)):
-                file_type = 'document'
-            
-            if not name:
-                name = os.path.splitext(os.path.basename(url))[0]
-            
-            files.append({
-                'name': name,
-                'url': url,
-                'type': file_type
-            })
-
-    return list({f['url']: f for f in files}.values())
+    tree = LexborHTMLParser(html_content)
+    files = {}
+
+    # Extract all media elements in a single selector pass
+    for node in tree.css(MEDIA_SELECTOR):
+        attrs = node.attributes
+        link = attrs.get('href') if node.tag == 'a' else attrs.get('src')
+        if not link:
+            continue
+        url, path = resolve_url(base_url, link)
+        if not url:
+            continue
+
+        # Determine file type before reading any node text
+        ext = os.path.splitext(path)[1].lower()
+        file_type = EXT_TO_TYPE.get(ext)
+        if file_type is None:
+            continue
+
+        if node.tag == 'a':
+            name = node.text(separator=' ', strip=True)
+        else:
+            name = attrs.get('alt') or attrs.get('title') or ''
+        if not name:
+            name = os.path.splitext(os.path.basename(url))[0]
+
+        files[url] = {
+            'name': name,
+            'url': url,
+            'type': file_type
+        }
+
+    return list(files.values())
+
+def is_permanent_failure(error):
+    # Client errors (except timeouts/rate limits), unusable local filenames and files Telegram rejects
+    if isinstance(error, aiohttp.ClientResponseError):
+        return 400 <= error.status < 500 and error.status not in (408, 429)
+    if isinstance(error, OSError):
+        return not isinstance(error, (aiohttp.ClientError, TimeoutError))
+    return isinstance(error, BadRequest)
+
+async def send_file(client, user_id, file):
+    # Each send gets its own directory so concurrent files with the same name don't clash
+    async with SEND_SEM:
+        with tempfile.TemporaryDirectory() as directory:
+            try:
+                filename = await download_file(file['url'], file['name'], directory)
+                if not filename:
+                    return 'skipped'
+                await client.send_document(
+                    int(user_id),
+                    filename,
+                    caption=f"📄 {file['name']}\n🔗 {file['url']}"
+                )
+            except Exception as e:
+                if not is_permanent_failure(e):
+                    raise
+                logger.warning(f"Giving up on {file['url']}: {e}")
+                return 'skipped'
+            return 'sent'
+
+async def handle_website_update(client, user_id, info, current_files):
+    stored_files = info.setdefault('files', [])
+
+    # Diff by URL against a set instead of comparing dicts against the whole list
+    stored_urls = {f['url'] for f in stored_files}
+    new_files = [f for f in current_files if f['url'] not in stored_urls]
+
+    results = await asyncio.gather(
+        *(send_file(client, user_id, file) for file in new_files),
+        return_exceptions=True
+    )
+    for file, result in zip(new_files, results):
+        # Failed files stay out of stored_files so the next change retries them
+        if isinstance(result, Exception):
+            logger.error(f"Sending {file['url']} failed: {result}")
+            continue
+        stored_files.append(file)
+
+    return all(not isinstance(result, Exception) for result in results)
+
+async def process_user_url(client, user_id, url, info, page):
+    try:
+        changed = False
+
+        # Hashes from a previous algorithm can't be compared; adopt the new one silently
+        if 'hash' in info and info.get('hash_algo', 'sha256') != HASH_ALGO:
+            info['hash'] = page['hash']
+            info['hash_algo'] = HASH_ALGO
+            changed = True
+        elif page['hash'] != info.get('hash'):
+            # Parse once per cycle in the pool, shared by every subscriber of this URL
+            if page['files'] is None:
+                page['files'] = asyncio.get_running_loop().run_in_executor(
+                    PARSE_POOL, extract_files, page['content'], url
+                )
+            delivered = await handle_website_update(client, user_id, info, await page['files'])
+            if not delivered:
+                # Keep the old hash so the failed files are retried next cycle
+                mark_user_data_dirty(user_id, url)
+                return
+            # Update hash after handling changes
+            info['hash'] = page['hash']
+            info['hash_algo'] = HASH_ALGO
+            changed = True
+
+        # Only remember validators once this content is handled, or a 304 would hide it
+        if any(info.get(key) != value for key, value in page['validators'].items()):
+            info.update(page['validators'])
+            changed = True
+
+        if changed:
+            mark_user_data_dirty(user_id, url)
+    except Exception as e:
+        logger.error(f"Update check failed for {url} ({user_id}): {e}")
+
+async def check_url(client, url, subscribers):
+    # Only send validators when every subscriber would send the same ones
+    validators = {(info.get('etag'), info.get('last_modified')) for _, info in subscribers}
+    etag, last_modified = validators.pop() if len(validators) == 1 else (None, None)
+
+    try:
+        content, current_hash, new_validators = await fetch_url_content(url, etag, last_modified)
+    except Exception as e:
+        logger.error(f"Update check failed for {url}: {e}")
+        return
+    if not content:
+        return
+
+    page = {'content': content, 'hash': current_hash, 'validators': new_validators, 'files': None}
+    await asyncio.gather(
+        *(process_user_url(client, user_id, url, info, page) for user_id, info in subscribers),
+        return_exceptions=True
+    )
+
+async def check_worker(client, queue):
+    while True:
+        url, subscribers = await queue.get()
+        try:
+            await check_url(client, url, subscribers)
+        except Exception as e:
+            logger.error(f"Update check failed for {url}: {e}")
+        finally:
+            queue.task_done()
 
 async def check_website_updates(client):
-    user_data = load_user_data()
+    user_data = await get_user_data()
+
+    # Fetch each URL once per cycle and fan the result out to its subscribers
+    urls_to_users = {}
     for user_id, data in user_data.items():
         for url, info in data.get('tracked_urls', {}).items():
-            try:
-                # Existing checking logic with improved error handling
-                content = fetch_url_content(url)
-                if not content:
-                    continue
-
-                current_hash = hashlib.sha256(content.encode()).hexdigest()
-                if current_hash != info.get('hash'):
-                    await handle_website_update(client, user_id, url, content)
-                    # Update hash after handling changes
-                    info['hash'] = current_hash
-                    save_user_data(user_data)
-            except Exception as e:
-                logger.error(f"Update check failed for {url}: {e}")
+            urls_to_users.setdefault(url, []).append((user_id, info))
+
+    queue = asyncio.Queue()
+    for item in urls_to_users.items():
+        queue.put_nowait(item)
+
+    workers = [asyncio.create_task(check_worker(client, queue)) for _ in range(CHECK_WORKERS)]
+    try:
+        await queue.join()
+    finally:
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
 
 # Improved scheduler configuration
 def schedule_job(url, user_id, interval, night_mode=False):
@@ -220,14 +647,14 @@ async def track(client, message):
         job = schedule_job(url, message.chat.id, interval, night_mode)
         
         # Save to user data with new format
-        user_data = load_user_data()
+        user_data = await get_user_data()
         user_data.setdefault(str(message.chat.id), {}).setdefault('tracked_urls', {})[url] = {
             'job_id': job.id,
             'interval': interval,
             'night_mode': night_mode,
             'last_checked': datetime.now(DEFAULT_TZ).isoformat()
         }
-        save_user_data(user_data)
+        mark_user_data_dirty(str(message.chat.id), url)
 
         await message.reply_text(
             f"✅ Tracking started for {url}\n"
@@ -267,6 +694,11 @@ def main():
         logger.error(f"Bot startup failed: {e}")
     finally:
         scheduler.shutdown()
+        PARSE_POOL.shutdown(wait=False)
+        loop = asyncio.get_event_loop()
+        loop.run_until_complete(flush_user_data())
+        loop.run_until_complete(close_state_db())
+        loop.run_until_complete(close_session())
 
 if __name__ == '__main__':
     main()
\ No newline at end of file